@@ -9,12 +9,19 @@ from langchain.chains import RetrievalQA
 from langchain_community.vectorstores import FAISS
 from langchain_google_genai import GoogleGenerativeAIEmbeddings
 from langchain_core.prompts import PromptTemplate, ChatPromptTemplate
-from langchain_core.runnables import RunnablePassthrough
+from langchain_core.runnables import RunnablePassthrough, RunnableLambda
+from langchain_core.embeddings import Embeddings
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.documents import Document
 from transformers import BlipProcessor, BlipForConditionalGeneration
 from PIL import Image
 from dotenv import load_dotenv
+from upstream import Upstream, UpstreamUnavailable
+from local_classifier import LocalClassifier
+from concurrent import futures
+from google.api_core import exceptions as google_exceptions
+import groq
+import httpx
 import torch
 import pickle
 import numpy as np
@@ -46,6 +53,7 @@ logger = logging.getLogger(__name__)
 df_ = pd.read_csv("synthetic_igrs_expanded_2014_2024_unique_desc.csv")
 
 df = df_.drop_duplicates(subset=["description"]).copy()
+del df_  # only the de-duplicated frame is used; don't keep both in every worker
 
 # Function to drop random complaints from each district
 def drop_random_complaints(group):
@@ -91,8 +99,69 @@ load_dotenv()
 groq_api_key = os.getenv("GROQ_API_KEY")
 os.environ["KMP_DUPLICATE_LIB_OK"] = "TRUE"
 os.environ["GOOGLE_API_KEY"] = os.getenv("GOOGLE_API_KEY")
-embedding_model = GoogleGenerativeAIEmbeddings(model="models/embedding-001")
-llm = ChatGroq(groq_api_key=groq_api_key, model_name="llama-3.1-8b-instant")
+
+# Upstream guards: identical in-flight prompts share one call, each upstream
+# has a concurrency cap and deadline, and a circuit breaker that fails fast
+# (so we can answer in degraded mode) while the upstream is down.
+# Only timeouts, connection errors, 429 and 5xx count as outages.
+groq_upstream = Upstream(
+    "groq",
+    max_concurrency=int(os.getenv("GROQ_MAX_CONCURRENCY", "8")),
+    deadline=float(os.getenv("GROQ_DEADLINE", "15")),
+    transient_errors=(TimeoutError, ConnectionError, groq.APIConnectionError),
+)
+embeddings_upstream = Upstream(
+    "google-embeddings",
+    max_concurrency=int(os.getenv("EMBEDDINGS_MAX_CONCURRENCY", "8")),
+    deadline=float(os.getenv("EMBEDDINGS_DEADLINE", "10")),
+    transient_errors=(TimeoutError, ConnectionError, google_exceptions.RetryError),
+)
+
+# One keep-alive connection pool shared by every Groq request.
+groq_http_client = httpx.Client(
+    limits=httpx.Limits(
+        max_connections=groq_upstream.max_concurrency,
+        max_keepalive_connections=groq_upstream.max_concurrency,
+    ),
+    timeout=groq_upstream.deadline,
+)
+embedding_model = GoogleGenerativeAIEmbeddings(
+    model="models/embedding-001",
+    request_options={"timeout": embeddings_upstream.deadline},
+)
+llm = ChatGroq(
+    groq_api_key=groq_api_key,
+    model_name="llama-3.1-8b-instant",
+    http_client=groq_http_client,
+    request_timeout=groq_upstream.deadline,
+    max_retries=0,  # the circuit breaker decides when to try again
+)
+
+
+def invoke_llm(prompt_value):
+    """Calls the LLM through groq_upstream; identical prompts in flight share one call."""
+    return groq_upstream.call(prompt_value.to_string(), lambda timeout: llm.invoke(prompt_value, timeout=timeout))
+
+
+class GuardedEmbeddings(Embeddings):
+    """Routes embedding calls through embeddings_upstream.
+
+    The Google client takes its timeout from `request_options` at construction,
+    not per call, so the remaining deadline isn't passed on here.
+    """
+
+    def __init__(self, embeddings, upstream):
+        self.embeddings = embeddings
+        self.upstream = upstream
+
+    def embed_documents(self, texts):
+        return self.upstream.call(("documents", tuple(texts)), lambda timeout: self.embeddings.embed_documents(texts))
+
+    def embed_query(self, text):
+        return self.upstream.call(("query", text), lambda timeout: self.embeddings.embed_query(text))
+
+
+guarded_embedding_model = GuardedEmbeddings(embedding_model, embeddings_upstream)
 
 urgency_prompt = ChatPromptTemplate.from_template(
     """
@@ -144,25 +213,26 @@ Response:
 
 
 
-def process_complaint(complaint):
-    main_query = query_prompt.invoke({'input': complaint})
-    response = llm.invoke(main_query)
-    department = response.content
-    
-    urgency_query = urgency_prompt.invoke({'input': complaint})
-    urgent = llm.invoke(urgency_query)
-    urgent_content = urgent.content
-    
-    category_query = category_prompt.invoke({'input': complaint})
-    cat = llm.invoke(category_query)
-    category = cat.content
+# The four classification prompts are independent, so they run concurrently
+# and the whole complaint is capped at COMPLAINT_DEADLINE seconds.
+COMPLAINT_DEADLINE = float(os.getenv("COMPLAINT_DEADLINE", "20"))
+complaint_executor = futures.ThreadPoolExecutor(max_workers=max(32, 4 * groq_upstream.max_concurrency))
 
-    subcategory_query = subcategory_prompt.invoke({'input': complaint})
-    subcat = llm.invoke(subcategory_query)
-    subcategory = subcat.content
-    
+def process_complaint(complaint):
+    prompts = [query_prompt, urgency_prompt, category_prompt, subcategory_prompt]
+    pending = [complaint_executor.submit(invoke_llm, prompt.invoke({'input': complaint})) for prompt in prompts]
+    done, not_done = futures.wait(pending, timeout=COMPLAINT_DEADLINE)
+    if not_done:
+        for future in not_done:
+            future.cancel()
+        raise UpstreamUnavailable(f"Complaint classification took longer than {COMPLAINT_DEADLINE}s")
+
+    department, urgent_content, category, subcategory = (future.result().content for future in pending)
     return department, urgent_content, category, subcategory
 
+# --- Local fallback classification (used while the LLM upstream is unavailable) ---
+local_classifier = LocalClassifier(df)
+
 # Load BLIP model
 processor = BlipProcessor.from_pretrained("Salesforce/blip-image-captioning-large")
 blip_model = BlipForConditionalGeneration.from_pretrained("Salesforce/blip-image-captioning-large")
@@ -271,7 +341,7 @@ def initialize_rag_pipeline():
     try:
         # FAISS.from_documents handles embedding generation internally
         # Ensure embedding_model is available
-        vectorstore = FAISS.from_documents(documents, embedding_model)
+        vectorstore = FAISS.from_documents(documents, guarded_embedding_model)
         logger.info("FAISS vector store created successfully.")
     except Exception as e:
         logger.error(f"Error creating FAISS vector store: {e}", exc_info=True)
@@ -310,7 +380,7 @@ Answer:
         rag_chain = (
             {"context": retriever, "question": RunnablePassthrough()}
             | prompt
-            | llm
+            | RunnableLambda(invoke_llm)
             | StrOutputParser()
         )
         logger.info("RAG chain built successfully.")
@@ -374,13 +444,21 @@ def handle_complaint():
     if not complaint:
         return jsonify({"error": "Complaint text is required"}), 400
     
-    department, urgent, category, subcategory = process_complaint(complaint)
+    try:
+        department, urgent, category, subcategory = process_complaint(complaint)
+        degraded = False
+    except Exception as e:
+        # Any LLM failure (outage, deadline, rejected prompt) gets the local answer.
+        logger.warning(f"LLM classification failed, classifying complaint locally: {e!r}")
+        department, urgent, category, subcategory = local_classifier.classify(complaint)
+        degraded = True
     print(f"Department: {department}, Urgent: {urgent}, Category: {category}, Subcategory: {subcategory}")
     return jsonify({
         "department": department,
         "urgent": urgent,
         "Category": category,
-        "Subcategory": subcategory
+        "Subcategory": subcategory,
+        "degraded": degraded
     })
 
 @app.route('/caption', methods=['POST'])
@@ -438,6 +516,10 @@ def ask():
         logger.info(f"Generated answer: {answer}")
         return jsonify({"answer": answer})
 
+    except UpstreamUnavailable as e:
+        logger.warning(f"Upstream unavailable for /ask: {e}")
+        return jsonify({"error": "The assistant is temporarily unavailable. Please try again shortly."}), 503
+
     except Exception as e:
         logger.error(f"Error invoking RAG chain: {e}", exc_info=True) # Log stack trace
         return jsonify({"error": "An internal error occurred while processing the question."}), 500
@@ -0,0 +1,196 @@
+"""Benchmark memory and throughput of the pre-fork server at several worker counts.
+
+Starts `gunicorn -c gunicorn.conf.py app:app` with 1, 4 and 8 workers, waits for
+the API to come up, then drives the model endpoints (`/predict` runs XGBoost,
+`/caption` runs BLIP) for a fixed duration each. Reports total RSS and total
+PSS (shared pages split between processes, which is what actually limits how
+many workers fit in RAM) right after startup and at the peak while under load,
+plus successful requests per second and failed requests per endpoint, as a
+Markdown table.
+
+    python bench_workers.py --workers 1 4 8 --duration 30
+
+Linux only (reads /proc).
+"""
+import argparse
+import io
+import json
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+PREDICT_PAYLOAD = {"category": "Road Maintenance", "subcategory": "Potholes", "pincode": "208001"}
+
+
+def read_memory_kb(pid):
+    """Returns (rss_kb, pss_kb) for a single process."""
+    rss = pss = 0
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            if line.startswith("Rss:"):
+                rss = int(line.split()[1])
+            elif line.startswith("Pss:"):
+                pss = int(line.split()[1])
+    return rss, pss
+
+
+def child_pids(pid):
+    with open(f"/proc/{pid}/task/{pid}/children") as f:
+        return [int(p) for p in f.read().split()]
+
+
+def total_memory_mb(master_pid):
+    rss = pss = 0
+    for pid in [master_pid] + child_pids(master_pid):
+        try:
+            r, p = read_memory_kb(pid)
+        except FileNotFoundError:
+            continue
+        rss += r
+        pss += p
+    return rss / 1024, pss / 1024
+
+
+class MemorySampler(threading.Thread):
+    """Samples total RSS/PSS of the server every `interval` seconds and keeps the peak."""
+
+    def __init__(self, master_pid, interval=1.0):
+        super().__init__(daemon=True)
+        self.master_pid = master_pid
+        self.interval = interval
+        self.peak = (0.0, 0.0)
+        self._done = threading.Event()
+
+    def run(self):
+        while not self._done.wait(self.interval):
+            rss, pss = total_memory_mb(self.master_pid)
+            self.peak = (max(self.peak[0], rss), max(self.peak[1], pss))
+
+    def stop(self):
+        self._done.set()
+        self.join()
+        return self.peak
+
+
+def sample_image_png():
+    """A 384x384 test image for /caption, generated so the benchmark has no file dependency."""
+    image = Image.new("RGB", (384, 384))
+    image.putdata([(x % 256, y % 256, (x + y) % 256) for y in range(384) for x in range(384)])
+    buf = io.BytesIO()
+    image.save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def predict_request(base_url):
+    return urllib.request.Request(
+        base_url + "/predict",
+        data=json.dumps(PREDICT_PAYLOAD).encode(),
+        headers={"Content-Type": "application/json"},
+    )
+
+
+def caption_request(base_url, png):
+    boundary = uuid.uuid4().hex
+    # /caption saves uploads to ./tmp/<filename> and deletes them afterwards, so
+    # concurrent requests need distinct names or they clobber each other's file.
+    body = (
+        f"--{boundary}\r\n"
+        f'Content-Disposition: form-data; name="image"; filename="{uuid.uuid4().hex}.png"\r\n'
+        "Content-Type: image/png\r\n\r\n"
+    ).encode() + png + f"\r\n--{boundary}--\r\n".encode()
+    return urllib.request.Request(
+        base_url + "/caption",
+        data=body,
+        headers={"Content-Type": f"multipart/form-data; boundary={boundary}"},
+    )
+
+
+def wait_until_up(url, timeout):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(url, timeout=5).read()
+            return True
+        except Exception:
+            time.sleep(1)
+    return False
+
+
+def measure_throughput(make_request, duration, concurrency):
+    """Returns (successful requests per second, number of failed requests)."""
+    deadline = time.time() + duration
+
+    def hit():
+        ok = failed = 0
+        while time.time() < deadline:
+            try:
+                urllib.request.urlopen(make_request(), timeout=120).read()
+                ok += 1
+            except Exception:
+                failed += 1
+        return ok, failed
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        counts = list(pool.map(lambda _: hit(), range(concurrency)))
+    return sum(ok for ok, _ in counts) / duration, sum(failed for _, failed in counts)
+
+
+def run(workers, args):
+    env = dict(os.environ, GUNICORN_WORKERS=str(workers), GUNICORN_BIND=f"127.0.0.1:{args.port}")
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "app:app"],
+        env=env,
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    base_url = f"http://127.0.0.1:{args.port}"
+    png = sample_image_png()
+    try:
+        if not wait_until_up(base_url + "/", args.startup_timeout):
+            raise RuntimeError(f"Server with {workers} workers did not come up")
+        # Let every worker finish booting before sampling memory.
+        time.sleep(5)
+        idle = total_memory_mb(proc.pid)
+        sampler = MemorySampler(proc.pid)
+        sampler.start()
+        predict = measure_throughput(lambda: predict_request(base_url), args.duration, args.concurrency)
+        caption = measure_throughput(lambda: caption_request(base_url, png), args.duration, args.concurrency)
+        peak = sampler.stop()
+        return idle, peak, predict, caption
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        proc.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--duration", type=int, default=30)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--port", type=int, default=5055)
+    parser.add_argument("--startup-timeout", type=int, default=600)
+    args = parser.parse_args()
+
+    results = [(w,) + run(w, args) for w in args.workers]
+
+    print(
+        "| workers | RSS MB idle | PSS MB idle | RSS MB peak | PSS MB peak "
+        "| /predict req/s | /predict failed | /caption req/s | /caption failed |"
+    )
+    print("|---|---|---|---|---|---|---|---|---|")
+    for workers, idle, peak, (predict_rps, predict_failed), (caption_rps, caption_failed) in results:
+        print(
+            f"| {workers} | {idle[0]:.0f} | {idle[1]:.0f} | {peak[0]:.0f} | {peak[1]:.0f} "
+            f"| {predict_rps:.1f} | {predict_failed} | {caption_rps:.2f} | {caption_failed} |"
+        )
+
+
+if __name__ == "__main__":
+    main()
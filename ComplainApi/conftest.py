@@ -0,0 +1,2 @@
+# chat_bot_test.py is a standalone Flask app, not a test module.
+collect_ignore = ["chat_bot_test.py"]
@@ -0,0 +1,57 @@
+# Production entry point for the complaint API.
+#
+#   gunicorn -c gunicorn.conf.py app:app
+#
+# app.py is imported once in the master (preload_app) so BLIP, the XGBoost
+# booster, the encoders, the pandas frames and the FAISS index are loaded a
+# single time and shared copy-on-write with every forked worker.
+import gc
+import os
+
+# Keep the cyclic GC off while the master preloads the app: collections would
+# free objects and leave holes in pages that worker allocations then fill,
+# un-sharing them. Objects are frozen in when_ready and GC is re-enabled in
+# each worker (see the gc.freeze() docs).
+gc.disable()
+
+workers = int(os.getenv("GUNICORN_WORKERS", "4"))
+threads = int(os.getenv("GUNICORN_THREADS", "4"))
+worker_class = "gthread"
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:5000")
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+preload_app = True
+
+
+def torch_threads_for(workers, threads):
+    """Cores per request thread, so concurrent torch ops in every worker
+    (each gthread thread gets its own OpenMP team) don't oversubscribe the CPU."""
+    return int(os.getenv("TORCH_THREADS_PER_REQUEST", max(1, (os.cpu_count() or 1) // (workers * threads))))
+
+
+# These must be set before app.py imports torch / grpc in the master. They
+# use the values from this file; post_fork re-applies the torch split from
+# the effective settings, so -w / --threads on the command line still count.
+os.environ.setdefault("OMP_NUM_THREADS", str(torch_threads_for(workers, threads)))
+os.environ.setdefault("MKL_NUM_THREADS", str(torch_threads_for(workers, threads)))
+os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+# Firestore and the Google embeddings client talk gRPC, which is only safe
+# to use across fork() with fork support turned on.
+os.environ.setdefault("GRPC_ENABLE_FORK_SUPPORT", "1")
+os.environ.setdefault("GRPC_POLL_STRATEGY", "poll")
+
+
+def when_ready(server):
+    """Runs in the master after app.py has been loaded, before any fork."""
+    # Move everything allocated during startup into the permanent generation
+    # so the GC in workers never writes to (and un-shares) those pages.
+    gc.freeze()
+    server.log.info("Froze %d startup objects before forking workers", gc.get_freeze_count())
+
+
+def post_fork(server, worker):
+    import torch
+
+    gc.enable()
+    torch_threads = torch_threads_for(server.cfg.workers, server.cfg.threads)
+    torch.set_num_threads(torch_threads)
+    server.log.info("Worker %s using %d torch threads per request thread", worker.pid, torch_threads)
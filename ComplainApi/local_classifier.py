@@ -0,0 +1,53 @@
+"""Local complaint classification, used by /complaint while the LLM is unavailable."""
+import re
+
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+CATEGORY_DEPARTMENTS = {
+    "Corruption": "Police",
+    "Crime": "Police",
+    "Electricity Issue": "PublicWorks",
+    "Public Transport": "Traffic",
+    "Road Maintenance": "PublicWorks",
+    "Water Supply": "PublicWorks",
+}
+
+# Whole words only ("gun" must not match "begun" or "Begunpur"). Stems such as
+# "electrocut" are spelled out as prefixes. "accident" and "ambulance" are left
+# out on purpose: ordinary pothole complaints mention them.
+EMERGENCY_PATTERN = re.compile(
+    r"\b(?:emergency|injured|injury|injuries|bleeding|fire|attack(?:ed|ing)?|assault(?:ed)?"
+    r"|collapsed?|live wire|sparking|gun|knife|stabbed|electrocut\w*)\b",
+    re.IGNORECASE,
+)
+
+UNCLASSIFIED = "Unclassified"
+
+
+class LocalClassifier:
+    """Classifies a complaint by its nearest labelled complaint (TF-IDF cosine).
+
+    `complaints` is a DataFrame with `description`, `category` and
+    `subcategory` columns, e.g. the synthetic IGRS CSV.
+    """
+
+    def __init__(self, complaints):
+        self.complaints = complaints.reset_index(drop=True)
+        self.vectorizer = TfidfVectorizer(stop_words="english")
+        self.matrix = self.vectorizer.fit_transform(self.complaints["description"])
+
+    def classify(self, complaint):
+        """Returns (department, urgent, category, subcategory), shaped like process_complaint's output."""
+        urgent = "YES" if EMERGENCY_PATTERN.search(complaint) else "NO"
+
+        scores = (self.matrix @ self.vectorizer.transform([complaint]).T).toarray()
+        if scores.max() == 0:
+            # No words in common with any labelled complaint; don't guess a category.
+            department = "Your complaint is registered and will be assigned to a department by an officer shortly."
+            return department, urgent, UNCLASSIFIED, UNCLASSIFIED
+
+        nearest = self.complaints.iloc[scores.argmax()]
+        category = nearest["category"]
+        subcategory = nearest["subcategory"]
+        department = f'Your complaint is registered with "{CATEGORY_DEPARTMENTS[category]}" and will be attended to shortly.'
+        return department, urgent, category, subcategory
@@ -0,0 +1,48 @@
+"""Tests for the local fallback classifier against the bundled complaint CSV."""
+import pandas as pd
+import pytest
+
+from local_classifier import CATEGORY_DEPARTMENTS, UNCLASSIFIED, LocalClassifier
+
+
+@pytest.fixture(scope="module")
+def classifier():
+    df = pd.read_csv("synthetic_igrs_expanded_2014_2024_unique_desc.csv")
+    return LocalClassifier(df.drop_duplicates(subset=["description"]))
+
+
+@pytest.mark.parametrize(
+    "complaint, category",
+    [
+        ("There are huge potholes on the main road near my house", "Road Maintenance"),
+        ("The officer at the registry office demanded a bribe to process my file", "Corruption"),
+        ("No water supply in our colony for the last three days", "Water Supply"),
+    ],
+)
+def test_classifies_by_nearest_complaint(classifier, complaint, category):
+    department, urgent, got_category, subcategory = classifier.classify(complaint)
+    assert got_category == category
+    assert f'"{CATEGORY_DEPARTMENTS[category]}"' in department
+    assert subcategory != UNCLASSIFIED
+
+
+def test_unrelated_text_is_left_unclassified(classifier):
+    department, urgent, category, subcategory = classifier.classify("zzzz qqqq")
+    assert (category, subcategory) == (UNCLASSIFIED, UNCLASSIFIED)
+    assert urgent == "NO"
+
+
+@pytest.mark.parametrize(
+    "complaint, urgent",
+    [
+        ("A man with a gun is threatening shopkeepers", "YES"),
+        ("My neighbour was electrocuted by a live wire", "YES"),
+        ("There is a FIRE in the transformer", "YES"),
+        ("Roadwork has begun but is still unfinished", "NO"),
+        ("Water supply in Begunpur is irregular", "NO"),
+        ("Ambulances struggle to reach patients because of the broken road", "NO"),
+        ("My friend met with an accident last week due to these potholes", "NO"),
+    ],
+)
+def test_urgency_matches_whole_words(classifier, complaint, urgent):
+    assert classifier.classify(complaint)[1] == urgent
@@ -0,0 +1,190 @@
+"""Guards for calls to upstream LLM / embedding APIs (Groq, Google).
+
+Each upstream gets an `Upstream` that:
+- coalesces identical in-flight requests into a single call (single-flight),
+- caps how many calls run against it at once,
+- gives every call one absolute deadline, covering the wait for a slot and
+  the HTTP call itself, instead of holding the Flask thread indefinitely,
+- trips a circuit breaker after repeated transient failures so callers can
+  serve a degraded answer straight away instead of piling up on a broken
+  upstream.
+
+Transient upstream failures (timeouts, connection errors, 429, 5xx) and
+local saturation are raised as `UpstreamUnavailable`; anything else (e.g. a
+400 for a bad request) is re-raised unchanged and leaves the breaker as it was.
+"""
+import threading
+import time
+from concurrent import futures
+
+
+class UpstreamUnavailable(Exception):
+    """Raised when an upstream can't be used right now (circuit open, saturated, too slow or failing)."""
+
+
+def is_transient_error(exc, transient_errors=(TimeoutError, ConnectionError)):
+    """True if `exc`, or an exception it was raised from, is an outage-type
+    error: one of `transient_errors`, or one carrying a 429 / 5xx status."""
+    seen = set()
+    while exc is not None and id(exc) not in seen:
+        seen.add(id(exc))
+        if isinstance(exc, transient_errors):
+            return True
+        status = getattr(exc, "status_code", None) or getattr(exc, "code", None)
+        if isinstance(status, int) and (status == 429 or status >= 500):
+            return True
+        exc = exc.__cause__ or exc.__context__
+    return False
+
+
+class CircuitBreaker:
+    """Closed -> open after `failure_threshold` consecutive failures.
+
+    Once `reset_timeout` seconds have passed the breaker lets a single probe
+    call through (half-open): success closes it again, failure re-opens it.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if self._probing or time.monotonic() - self._opened_at >= self.reset_timeout:
+                return "half-open"
+            return "open"
+
+    def allow(self):
+        """Returns True if a call may go through. Every allowed call must be
+        followed by record_success(), record_failure() or release()."""
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self._probing or time.monotonic() - self._opened_at < self.reset_timeout:
+                return False
+            self._probing = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._probing or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+            self._probing = False
+
+    def release(self):
+        """Ends an allowed call that says nothing about the upstream's health:
+        frees the half-open probe without changing the failure count or state."""
+        with self._lock:
+            self._probing = False
+
+
+class SingleFlight:
+    """Runs at most one call per key at a time; concurrent callers with the
+    same key wait for and share the first caller's result (or exception)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn, timeout=None):
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = futures.Future()
+                self._calls[key] = future
+
+        if not leader:
+            try:
+                return future.result(timeout)
+            except futures.TimeoutError:
+                raise UpstreamUnavailable(f"Timed out after {timeout}s waiting for in-flight call")
+
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+
+class Upstream:
+    """Single-flight, concurrency limit, deadline and circuit breaker for one upstream."""
+
+    def __init__(
+        self,
+        name,
+        max_concurrency=8,
+        deadline=15.0,
+        failure_threshold=5,
+        reset_timeout=30.0,
+        transient_errors=(TimeoutError, ConnectionError),
+    ):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.deadline = deadline
+        self.transient_errors = transient_errors
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._flight = SingleFlight()
+
+    def call(self, key, fn):
+        """Returns fn(timeout), sharing the call with any identical in-flight `key`.
+
+        `timeout` is what is left of this call's deadline once a slot has
+        been acquired; fn should pass it on as its HTTP timeout. Raises
+        UpstreamUnavailable instead of waiting past the deadline, calling
+        the upstream while its circuit is open, or on a transient failure.
+        """
+        expires_at = time.monotonic() + self.deadline
+        return self._flight.do(key, lambda: self._call(fn, expires_at), timeout=self.deadline)
+
+    def _call(self, fn, expires_at):
+        if self.breaker.state == "open":
+            raise UpstreamUnavailable(f"{self.name} circuit is open")
+        # Running out of our own slots is local saturation, not an upstream
+        # fault, so it doesn't count against the breaker.
+        if not self._slots.acquire(timeout=max(0.0, expires_at - time.monotonic())):
+            raise UpstreamUnavailable(f"{self.name} has no free slot within {self.deadline}s")
+        try:
+            remaining = expires_at - time.monotonic()
+            if remaining <= 0:
+                raise UpstreamUnavailable(f"{self.name} deadline of {self.deadline}s expired")
+            if not self.breaker.allow():
+                raise UpstreamUnavailable(f"{self.name} circuit is open")
+            try:
+                result = fn(remaining)
+            except Exception as e:
+                if is_transient_error(e, self.transient_errors):
+                    self.breaker.record_failure()
+                    raise UpstreamUnavailable(f"{self.name} call failed: {e!r}") from e
+                # A 4xx, a bad API key, a parse error or a bug: not an outage,
+                # but not proof the upstream is healthy either.
+                self.breaker.release()
+                raise
+            except BaseException:
+                self.breaker.release()
+                raise
+            self.breaker.record_success()
+            return result
+        finally:
+            self._slots.release()